@@ -1,13 +1,23 @@
 import os
-import json
 import re
 import warnings
 import io
 import contextlib
 import datetime
 import uuid
-import webbrowser
-from datetime import datetime, timezone
+import tempfile
+import threading
+import hashlib
+import random
+import multiprocessing
+import subprocess
+import sys
+import time
+import queue
+import atexit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
 
 # Load environment variables from .env file using python-dotenv
 from dotenv import load_dotenv
@@ -18,24 +28,34 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 # External imports
 from openai import OpenAI
-from pvrecorder import PvRecorder
-from playsound import playsound
-from IPython.display import Image, display
+import orjson
 
 # Flask and related modules
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Request as FlaskRequest, render_template, request, redirect, url_for, flash, make_response
 from werkzeug.utils import secure_filename
+from jinja2 import FileSystemBytecodeCache
 
 # Google OAuth and Calendar Imports
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 
 # OCR and file conversion Imports
+# Pages are OCR'd concurrently, so limit each Tesseract to one OpenMP thread to avoid
+# oversubscribing the cores. Must be set before Tesseract is loaded.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
 from PIL import Image as PILImage
 import pytesseract
-from pdf2image import convert_from_path
-from docx2pdf import convert
+try:
+    from tesserocr import PyTessBaseAPI, OEM, PSM
+except ImportError:
+    PyTessBaseAPI = None
+# pdf2image, python-docx and pdfplumber are imported in the functions that use them,
+# so requests without a PDF/DOCX upload never pay for loading them
+
+# Disk caches for OCR text and generated code
+from diskcache import Cache
 
 # Time zone imports
 from tzlocal import get_localzone
@@ -47,14 +67,82 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
 # Initialize Flask app and set secret key from environment variables
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev_secret_key")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Persist compiled template bytecode so restarted workers skip recompiling templates.
+# Must be configured before app.jinja_env is first used. With no directory, Jinja uses
+# a private per-user temp dir (mode 0700, owner checked) that other users can't plant files in.
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache()}
+
+# Reject oversized uploads before they are read
+app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024
+
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+
+class UploadRequest(FlaskRequest):
+    """
+    Request class that streams uploaded documents straight into UPLOAD_FOLDER while
+    the multipart body is parsed, so the route can OCR them in place instead of
+    buffering them and copying them again with file.save. Each upload gets a unique
+    temp name (keeping its extension), so concurrent uploads of the same file name
+    never collide. Images are kept in memory and OCR'd without touching disk at all.
+    Every file created is recorded in spooled_uploads so teardown can delete it even
+    if parsing never finished (client disconnect, truncated body).
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if filename and '.' in filename and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS:
+            return io.BytesIO()
+        suffix = os.path.splitext(secure_filename(filename or ''))[1].lower()
+        spooled_file = tempfile.NamedTemporaryFile('wb+', dir=app.config['UPLOAD_FOLDER'], suffix=suffix, delete=False)
+        self.__dict__.setdefault('spooled_uploads', []).append(spooled_file)
+        return spooled_file
+
+app.request_class = UploadRequest
+
+
+@app.teardown_request
+def remove_unused_uploads(exc):
+    """
+    Delete the uploads streamed to disk for this request.
+    """
+    # Walk the files UploadRequest created rather than request.files: parts the parser
+    # never finished aren't in request.files, and touching it here would re-parse the
+    # body (raising RequestEntityTooLarge again inside teardown for oversized ones)
+    for spooled_file in request.__dict__.get('spooled_uploads', ()):
+        spooled_file.close()
+        if os.path.exists(spooled_file.name):
+            os.remove(spooled_file.name)
+
 # Allowed file extensions for upload
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'docx'}
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+# Born-digital DOCX files with at least this much embedded text skip conversion and OCR
+DOCX_MIN_TEXT_CHARS = 200
+# Born-digital PDFs with at least this much text on the selected pages skip OCR
+PDF_MIN_TEXT_CHARS = 100
+
+# Tesseract settings tuned for printed event text: LSTM engine, single uniform text block.
+# If the "fast" traineddata is placed in ./tessdata_fast it is used instead of the system models.
+TESSDATA_FAST_DIR = os.path.join(APP_DIR, 'tessdata_fast')
+if os.path.isdir(TESSDATA_FAST_DIR):
+    os.environ['TESSDATA_PREFIX'] = TESSDATA_FAST_DIR
+TESSERACT_CONFIG = '--oem 1 --psm 6 -l eng'
+
+# Images are converted to grayscale and downscaled to fit this many pixels on their
+# longest side before OCR; Tesseract's runtime scales with pixel count. Binarization is
+# left to Tesseract, whose adaptive thresholding copes with unevenly lit photos.
+OCR_MAX_IMAGE_SIDE = 2000
+
+# PDF rasterization settings; 200 DPI grayscale JPEG is plenty for printed text.
+# Poppler gains little past a handful of concurrent rasterizer processes.
+PDF_RENDER_MAX_THREADS = 4
+PDF_RENDER_OPTIONS = {'dpi': 200, 'thread_count': min(PDF_RENDER_MAX_THREADS, os.cpu_count() or 1),
+                      'fmt': 'jpeg', 'grayscale': True, 'paths_only': True}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -91,20 +179,135 @@ def create_credentials_file():
                 ]
             }
         }
-        with open('credentials.json', 'w') as f:
-            json.dump(credentials_data, f, indent=4)
+        with open('credentials.json', 'wb') as f:
+            f.write(orjson.dumps(credentials_data, option=orjson.OPT_INDENT_2))
         print("credentials.json created successfully!")
     else:
         print("credentials.json already exists.")
 
 
+# In-process credential cache so token.json isn't re-read and re-parsed on every call.
+# It is keyed on token.json's mtime so a token written by another process is picked up.
+# Cached creds are refreshed in the background shortly before they expire.
+_CREDS_CACHE = {"creds": None, "mtime": None, "refresh_timer": None}
+# Serializes refresh-and-save between the refresh timer and request threads
+_CREDS_REFRESH_LOCK = threading.Lock()
+CREDS_REFRESH_MARGIN = timedelta(minutes=5)
+# Each process's timer fires at a random point in this window so the first to refresh
+# writes token.json and the others pick that token up instead of refreshing again
+CREDS_REFRESH_JITTER = timedelta(minutes=2)
+
+def _creds_are_fresh(creds):
+    """
+    Return True if creds are valid and not within CREDS_REFRESH_MARGIN of expiring.
+    """
+    if not creds or not creds.valid:
+        return False
+    return creds.expiry is None or creds.expiry - datetime.utcnow() > CREDS_REFRESH_MARGIN
+
+
+def _token_mtime():
+    try:
+        return os.path.getmtime('token.json')
+    except OSError:
+        return None
+
+
+def _load_token(mtime):
+    """
+    Read token.json into credentials and record the mtime it was read at.
+    """
+    # Parse with orjson and build the creds from the dict instead of google-auth's file loader
+    with open('token.json', 'rb') as token_file:
+        creds = Credentials.from_authorized_user_info(orjson.loads(token_file.read()), SCOPES)
+    _CREDS_CACHE["mtime"] = mtime
+    return creds
+
+
+def _save_token(creds):
+    """
+    Write token.json atomically so other processes never read a partial file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir='.', prefix='token.json.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as token_file:
+            token_file.write(creds.to_json())
+        os.replace(temp_path, 'token.json')
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _CREDS_CACHE["mtime"] = _token_mtime()
+
+
+def _refresh_and_save(creds):
+    """
+    Refresh creds and persist the new token, unless another thread already refreshed them.
+    """
+    with _CREDS_REFRESH_LOCK:
+        if _creds_are_fresh(creds):
+            return
+        creds.refresh(Request())
+        _save_token(creds)
+
+
+def _refresh_cached_creds():
+    """
+    Timer callback: refresh the cached creds and persist the new token, unless another
+    process has already written a newer token.json, which is then used instead.
+    """
+    try:
+        mtime = _token_mtime()
+        if mtime is not None and mtime != _CREDS_CACHE["mtime"]:
+            _CREDS_CACHE["creds"] = _load_token(mtime)
+        creds = _CREDS_CACHE["creds"]
+        _refresh_and_save(creds)
+        print("Google credentials refreshed.")
+    except Exception as e:
+        print(f"Error refreshing Google credentials: {e}")
+        return
+    _schedule_creds_refresh(creds)
+
+
+def _schedule_creds_refresh(creds):
+    """
+    Schedule a background refresh CREDS_REFRESH_MARGIN (minus some jitter) before creds expire.
+    """
+    timer = _CREDS_CACHE["refresh_timer"]
+    if timer:
+        timer.cancel()
+    if not creds.expiry or not creds.refresh_token:
+        return
+    delay = (creds.expiry - datetime.utcnow() - CREDS_REFRESH_MARGIN).total_seconds()
+    delay -= random.uniform(0, CREDS_REFRESH_JITTER.total_seconds())
+    timer = threading.Timer(max(delay, 0), _refresh_cached_creds)
+    timer.daemon = True
+    timer.start()
+    _CREDS_CACHE["refresh_timer"] = timer
+
+
 def authenticate():
     """
     Authenticate with Google Calendar using OAuth and return credentials.
+    Credentials are cached in-process; token.json is only read on a cold cache or
+    when its mtime changes, and only written when the token is refreshed or newly issued.
     """
-    creds = None
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    creds = _CREDS_CACHE["creds"]
+    mtime = _token_mtime()
+    if mtime != _CREDS_CACHE["mtime"]:
+        # token.json changed on disk (e.g. refreshed by another worker); reload it
+        creds = None
+    if _creds_are_fresh(creds):
+        return creds
+
+    if creds is None and mtime is not None:
+        creds = _load_token(mtime)
+    if creds and creds.refresh_token and not _creds_are_fresh(creds):
+        try:
+            _refresh_and_save(creds)
+        except Exception as e:
+            print(f"Error refreshing Google credentials: {e}")
+            creds = None
     if not creds or not creds.valid:
         flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
         try:
@@ -113,15 +316,283 @@ def authenticate():
         except Exception:
             print("Error launching local server for authentication, falling back to console input.")
             creds = flow.run_console()
-        with open('token.json', 'w') as token_file:
-            token_file.write(creds.to_json())
+        _save_token(creds)
         print("token.json created successfully!")
+
+    _CREDS_CACHE["creds"] = creds
+    _schedule_creds_refresh(creds)
     return creds
 
 
+# Calendar API client keyed by the account's refresh token, so access-token refreshes
+# keep the same client and only a new authorization builds a new one
+_SERVICE_CACHE = {}
+_SERVICE_CACHE_LOCK = threading.Lock()
+
+def get_calendar_service():
+    """
+    Return a Google Calendar API client, built once and reused so each call
+    skips client construction and keeps its HTTP connection warm. The bundled
+    discovery document is used, so building never makes a network request.
+    """
+    creds = authenticate()
+    cache_key = creds.refresh_token or creds.token
+    # Serialize so concurrent requests don't each build a client on a cold cache
+    with _SERVICE_CACHE_LOCK:
+        service = _SERVICE_CACHE.get(cache_key)
+        if service is None:
+            service = build('calendar', 'v3', credentials=creds, static_discovery=True)
+            # The app acts for a single account; drop clients for superseded tokens
+            _SERVICE_CACHE.clear()
+            _SERVICE_CACHE[cache_key] = service
+    return service
+
+
+# The Calendar API accepts at most this many calls per batch request
+CALENDAR_BATCH_LIMIT = 50
+
+def create_calendar_events(events, calendar_id='primary'):
+    """
+    Insert several event bodies with batched HTTP requests of up to CALENDAR_BATCH_LIMIT calls.
+    Returns the created events in order; failed inserts are reported and skipped.
+    """
+    service = get_calendar_service()
+    created_events = [None] * len(events)
+
+    def on_created(request_id, response, exception):
+        if exception is not None:
+            print(f"Error creating event {int(request_id) + 1}: {exception}")
+        else:
+            created_events[int(request_id)] = response
+
+    for batch_start in range(0, len(events), CALENDAR_BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=on_created)
+        for index in range(batch_start, min(batch_start + CALENDAR_BATCH_LIMIT, len(events))):
+            batch.add(service.events().insert(calendarId=calendar_id, body=events[index], conferenceDataVersion=1),
+                      request_id=str(index))
+        batch.execute()
+    return [created_event for created_event in created_events if created_event is not None]
+
+
 # ------------------------------
 # OCR Functionality with Page Selection
 # ------------------------------
+# Pool of warm in-process Tesseract engines (tesserocr), up to one per CPU core, so language
+# data is loaded once per engine instead of on every pytesseract subprocess and pages
+# can be recognized concurrently. Falls back to pytesseract if tesserocr is unavailable.
+# Engines are created on demand and the pool is keyed on the pid, so gunicorn --preload,
+# job workers and forked children never share engines with the process that forked them.
+TESS_MAX_ENGINES = os.cpu_count() or 1
+# How long a caller waits for a busy engine before rechecking whether it may create one
+TESS_ENGINE_WAIT_SECONDS = 1
+_TESS_ENGINES = {"pid": None, "pool": None, "created": 0}
+_TESS_ENGINES_LOCK = threading.Lock()
+
+
+def _borrow_tess_engine():
+    """
+    Take an idle engine from this process's pool and return (pool, engine).
+    A new engine is created only when all existing ones are busy and fewer than
+    TESS_MAX_ENGINES exist; otherwise this waits for one to be returned.
+    """
+    while True:
+        with _TESS_ENGINES_LOCK:
+            if _TESS_ENGINES["pid"] != os.getpid():
+                _TESS_ENGINES.update(pid=os.getpid(), pool=queue.Queue(), created=0)
+            pool = _TESS_ENGINES["pool"]
+            try:
+                return pool, pool.get_nowait()
+            except queue.Empty:
+                pass
+            create_engine = _TESS_ENGINES["created"] < TESS_MAX_ENGINES
+            if create_engine:
+                _TESS_ENGINES["created"] += 1
+        if create_engine:
+            break
+        # Wait with a timeout: if a pending creation fails, no engine will ever be returned
+        # and this caller must go back and create one itself
+        try:
+            return pool, pool.get(timeout=TESS_ENGINE_WAIT_SECONDS)
+        except queue.Empty:
+            pass
+
+    # Built outside the lock so concurrent first requests load models in parallel
+    tess_options = {'path': TESSDATA_FAST_DIR} if os.path.isdir(TESSDATA_FAST_DIR) else {}
+    try:
+        return pool, PyTessBaseAPI(lang='eng', oem=OEM.LSTM_ONLY, psm=PSM.SINGLE_BLOCK, **tess_options)
+    except Exception:
+        with _TESS_ENGINES_LOCK:
+            _TESS_ENGINES["created"] -= 1
+        raise
+
+
+def _end_tess_engines():
+    """
+    Release this process's warm Tesseract engines at interpreter exit.
+    """
+    pool = _TESS_ENGINES["pool"]
+    if pool is None or _TESS_ENGINES["pid"] != os.getpid():
+        return
+    while not pool.empty():
+        pool.get_nowait().End()
+
+atexit.register(_end_tess_engines)
+
+def _preprocess(image):
+    """
+    Grayscale and downscale an image so Tesseract processes fewer pixels.
+    """
+    # For JPEGs (phone photos, rendered PDF pages) let the decoder do the grayscale
+    # conversion and a coarse downscale instead of decoding every full-color pixel.
+    # draft() is a no-op for other formats and for images that are already loaded.
+    image.draft('L', (OCR_MAX_IMAGE_SIDE, OCR_MAX_IMAGE_SIDE))
+    image = image.convert('L')
+    if max(image.size) > OCR_MAX_IMAGE_SIDE:
+        image.thumbnail((OCR_MAX_IMAGE_SIDE, OCR_MAX_IMAGE_SIDE), PILImage.LANCZOS)
+    return image
+
+
+def image_to_text(image):
+    """
+    OCR a single PIL image, borrowing a warm engine from the pool when available.
+    """
+    image = _preprocess(image)
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+    # Engines are not thread-safe, so each one is used by a single thread at a time
+    try:
+        engines, api = _borrow_tess_engine()
+    except Exception as e:
+        print(f"Error creating Tesseract engine, falling back to pytesseract: {e}")
+        return pytesseract.image_to_string(image, config=TESSERACT_CONFIG)
+    try:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+    finally:
+        engines.put(api)
+
+
+def _ocr_page(page_path):
+    """
+    OCR a single rendered page image from disk.
+    """
+    with PILImage.open(page_path) as image:
+        return image_to_text(image)
+
+
+def _ocr_pages_batched(page_paths):
+    """
+    OCR page images with a single Tesseract run over an image-list file,
+    so the engine is initialized once instead of once per page.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        prepared_paths = []
+        for page_number, page_path in enumerate(page_paths, start=1):
+            prepared_path = os.path.join(temp_dir, f"p{page_number}.png")
+            with PILImage.open(page_path) as image:
+                _preprocess(image).save(prepared_path, optimize=False, compress_level=1)
+            prepared_paths.append(prepared_path)
+        list_path = os.path.join(temp_dir, "list.txt")
+        with open(list_path, 'w') as f:
+            f.write("\n".join(prepared_paths) + "\n")
+        text = pytesseract.image_to_string(list_path, config=TESSERACT_CONFIG)
+
+    # Tesseract separates pages with a form feed
+    page_texts = text.split("\f")
+    return (page_texts + [""] * len(page_paths))[:len(page_paths)]
+
+
+def ocr_pages(page_paths):
+    """
+    OCR a list of rendered page image files, preserving page order.
+    Each page gets a "--- Page N ---" header.
+    """
+    if not page_paths:
+        return ""
+    max_workers = min(len(page_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if PyTessBaseAPI is not None:
+            # Each page borrows a warm engine; tesserocr releases the GIL while recognizing
+            results = list(executor.map(_ocr_page, page_paths))
+        else:
+            # Each worker OCRs a contiguous chunk of pages in one batched Tesseract subprocess,
+            # so pages run on separate cores and the engine starts once per worker, not per page
+            chunk_size = -(-len(page_paths) // max_workers)
+            chunks = [page_paths[i:i + chunk_size] for i in range(0, len(page_paths), chunk_size)]
+            results = [page_text for chunk_texts in executor.map(_ocr_pages_batched, chunks)
+                       for page_text in chunk_texts]
+    return "".join(f"--- Page {page_number} ---\n{page_text}\n"
+                   for page_number, page_text in enumerate(results, start=1))
+
+
+def ocr_pdf(pdf_path, selected_pages=None):
+    """
+    Rasterize a PDF into page images on disk and OCR them.
+    Pages are written straight to a temp folder instead of being held in memory.
+    If selected_pages is provided, only process those pages (1-indexed).
+    """
+    from pdf2image import convert_from_path
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if selected_pages:
+            # Only rasterize the requested pages instead of the whole document, one poppler
+            # process per page in parallel; pages past the end of the PDF come back empty
+            def render_page(page_num):
+                return convert_from_path(pdf_path, output_folder=temp_dir, first_page=page_num,
+                                         last_page=page_num, **PDF_RENDER_OPTIONS)
+
+            page_nums = [page_num for page_num in selected_pages if page_num >= 1]
+            max_workers = max(1, min(PDF_RENDER_MAX_THREADS, len(page_nums)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                page_paths = [page_path for rendered in executor.map(render_page, page_nums)
+                              for page_path in rendered]
+        else:
+            page_paths = convert_from_path(pdf_path, output_folder=temp_dir, **PDF_RENDER_OPTIONS)
+        print(f"Processing {len(page_paths)} page(s) from {pdf_path}...")
+        return ocr_pages(page_paths)
+
+
+def extract_docx_text(docx_path):
+    """
+    Read the text embedded in a DOCX (paragraphs and tables) without converting it.
+    """
+    import docx
+
+    try:
+        document = docx.Document(docx_path)
+    except Exception as e:
+        print(f"Error reading DOCX text: {e}")
+        return ""
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append(" | ".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+
+def extract_pdf_text(pdf_path, selected_pages=None):
+    """
+    Read the text layer of a born-digital PDF. Scanned PDFs come back empty.
+    If selected_pages is provided, only read those pages (1-indexed).
+    """
+    import pdfplumber
+
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            pages = pdf.pages
+            if selected_pages:
+                pages = [pages[page_num - 1] for page_num in selected_pages if 1 <= page_num <= len(pages)]
+            page_texts = [page.extract_text() or "" for page in pages]
+    except Exception as e:
+        print(f"Error reading PDF text layer: {e}")
+        return ""
+    # Too little text means a scan (or only stray artifacts); let OCR handle it
+    if sum(len(page_text.strip()) for page_text in page_texts) < PDF_MIN_TEXT_CHARS:
+        return ""
+    return "".join(f"--- Page {page_number} ---\n{page_text}\n"
+                   for page_number, page_text in enumerate(page_texts, start=1))
+
+
 def ocr_image(file_path_or_object, selected_pages=None):
     """
     Perform OCR on a file (image, PDF, or DOCX).
@@ -130,59 +601,50 @@ def ocr_image(file_path_or_object, selected_pages=None):
     try:
         if isinstance(file_path_or_object, str):
             if file_path_or_object.lower().endswith(".pdf"):
-                pdf_images = convert_from_path(file_path_or_object, dpi=300)
-                if selected_pages:
-                    filtered_images = []
-                    for page_num in selected_pages:
-                        if 1 <= page_num <= len(pdf_images):
-                            filtered_images.append(pdf_images[page_num - 1])
-                    pdf_images = filtered_images
-
-                extracted_text = ""
-                for page_number, image in enumerate(pdf_images, start=1):
-                    print(f"Processing page {page_number} from PDF...")
-                    page_text = pytesseract.image_to_string(image)
-                    extracted_text += f"--- Page {page_number} ---\n{page_text}\n"
+                # Prefer the embedded text layer; only scanned PDFs need OCR
+                extracted_text = extract_pdf_text(file_path_or_object, selected_pages)
+                if extracted_text:
+                    print("Text extracted from PDF text layer:", extracted_text)
+                    return extracted_text
+                extracted_text = ocr_pdf(file_path_or_object, selected_pages)
                 print("OCR extracted text from PDF:", extracted_text)
                 return extracted_text
 
             elif file_path_or_object.lower().endswith(".docx"):
+                # Born-digital DOCX text is read directly, skipping the PDF conversion and OCR.
+                # A DOCX has no fixed pages, so a page selection still goes through the PDF path.
+                docx_text = extract_docx_text(file_path_or_object)
+                if not selected_pages and len(docx_text.strip()) > DOCX_MIN_TEXT_CHARS:
+                    print("Text extracted from DOCX:", docx_text)
+                    return docx_text
+
                 temp_pdf = file_path_or_object.rsplit('.', 1)[0] + '_temp.pdf'
                 print(f"Converting DOCX to PDF: {file_path_or_object} -> {temp_pdf}")
                 try:
+                    # Imported lazily: docx2pdf is slow to import and only needed for scanned DOCX
+                    from docx2pdf import convert
                     convert(file_path_or_object, temp_pdf)
                     print("DOCX conversion successful.")
                 except Exception as e:
+                    # docx2pdf needs Word (Windows/macOS); keep whatever text the DOCX embeds
                     print(f"Error during DOCX to PDF conversion: {e}")
-                    return ""
-                pdf_images = convert_from_path(temp_pdf, dpi=300)
-                if selected_pages:
-                    filtered_images = []
-                    for page_num in selected_pages:
-                        if 1 <= page_num <= len(pdf_images):
-                            filtered_images.append(pdf_images[page_num - 1])
-                    pdf_images = filtered_images
-
-                extracted_text = ""
-                for page_number, image in enumerate(pdf_images, start=1):
-                    print(f"Processing page {page_number} from DOCX (converted PDF)...")
-                    page_text = pytesseract.image_to_string(image)
-                    extracted_text += f"--- Page {page_number} ---\n{page_text}\n"
+                    return docx_text
+                extracted_text = ocr_pdf(temp_pdf, selected_pages)
                 os.remove(temp_pdf)
                 print("OCR extracted text from DOCX:", extracted_text)
-                return extracted_text
+                return extracted_text or docx_text
 
             else:
                 # Assume the file is an image
                 image = PILImage.open(file_path_or_object)
-                text = pytesseract.image_to_string(image)
+                text = image_to_text(image)
                 print("OCR extracted text from image:", text)
                 return text
 
         else:
             # Process a file-like object as an image
             image = PILImage.open(file_path_or_object)
-            text = pytesseract.image_to_string(image)
+            text = image_to_text(image)
             print("OCR extracted text from image:", text)
             return text
 
@@ -191,6 +653,47 @@ def ocr_image(file_path_or_object, selected_pages=None):
         return ""
 
 
+# OCR results are cached by file content and page selection so re-uploads skip OCR entirely.
+# The OCR settings are part of the key so changing them doesn't keep serving stale text.
+OCR_CACHE_DIR = 'ocrcache'
+OCR_CACHE_SIZE_LIMIT = 2 ** 30
+_OCR_CACHE = Cache(OCR_CACHE_DIR, size_limit=OCR_CACHE_SIZE_LIMIT)
+_OCR_SETTINGS = (TESSERACT_CONFIG, os.path.isdir(TESSDATA_FAST_DIR), PyTessBaseAPI is not None,
+                 OCR_MAX_IMAGE_SIDE, PDF_RENDER_OPTIONS['dpi'], DOCX_MIN_TEXT_CHARS, PDF_MIN_TEXT_CHARS)
+
+def file_sha1(file_path):
+    """
+    Return the SHA-1 hex digest of a file's contents, read in chunks.
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_ocr(file_path_or_bytes, selected_pages=None):
+    """
+    Run ocr_image on an upload (a saved file path, or image bytes held in memory),
+    memoized by file content and selected pages.
+    """
+    if isinstance(file_path_or_bytes, bytes):
+        digest = hashlib.sha1(file_path_or_bytes).hexdigest()
+        source = io.BytesIO(file_path_or_bytes)
+    else:
+        digest = file_sha1(file_path_or_bytes)
+        source = file_path_or_bytes
+    cache_key = (digest, tuple(selected_pages or ()), _OCR_SETTINGS)
+    text = _OCR_CACHE.get(cache_key)
+    if text is not None:
+        print("Using cached OCR text.")
+        return text
+    text = ocr_image(source, selected_pages=selected_pages)
+    if text:
+        _OCR_CACHE.set(cache_key, text)
+    return text
+
+
 # ------------------------------
 # Input Combination Function
 # ------------------------------
@@ -198,66 +701,88 @@ def combine_inputs(user_input, ocr_text):
     """
     Combine the single text input with OCR extracted text.
     """
-    combined_parts = []
-    if user_input:
-        combined_parts.append(user_input)
-    if ocr_text:
-        combined_parts.append(ocr_text)
-    return " ".join(combined_parts)
+    if user_input and ocr_text:
+        return f"{user_input} {ocr_text}"
+    return user_input or ocr_text or ""
 
 
 # ------------------------------
 # GPT-4o Chatbot Class
 # ------------------------------
 class GPT4o:
-    def __init__(self, client, json_file='gpt4oContext1.json'):
+    _save_lock = threading.Lock()
+    _system_message = {"role": "system", "content": "You are a helpful assistant."}
+
+    def __init__(self, client, json_file='gpt4oContext1.jsonl'):
         self.client = client
         self.context = []
         self.json_file = json_file
 
-    def chat(self, message, save=False):
+    def chat(self, message, save=False, stop_at_code_block=False, stateless=False):
         message = (message or "") + " "
+        user_message = {"role": "user", "content": message}
 
-        if not self.context:
-            self.context.append({"role": "system", "content": "You are a helpful assistant."})
-
-        self.context.append({"role": "user", "content": message})
+        if stateless:
+            # One-off request: send only this message and leave self.context untouched,
+            # so concurrent callers sharing this instance never see each other's turns
+            messages = [self._system_message, user_message]
+        else:
+            if not self.context:
+                self.context.append(self._system_message)
+            self.context.append(user_message)
+            messages = self.context
 
         response = self.client.chat.completions.create(
             model="gpt-4o",
-            messages=self.context
+            messages=messages,
+            stream=True
         )
-        response_content = response.choices[0].message.content
-
-        self.context.append({"role": "assistant", "content": response_content})
-        self.save_to_json(message, response_content, save)
+        response_content = ""
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                response_content += chunk.choices[0].delta.content or ""
+                # Once the Python code block is closed the rest is prose; stop generating it
+                if stop_at_code_block and _CODE_RE.search(response_content):
+                    break
+        finally:
+            response.close()
+
+        if not stateless:
+            self.context.append({"role": "assistant", "content": response_content})
 
-        if not save:
-            json_files_to_clear = ['gpt4oContext1.json', 'gpt4oMiniContext1.json', 'gpt3pt5TurboContext1.json']
-            self.clear_json_files(json_files_to_clear)
+        if save:
+            # Persist off the request thread so disk I/O never delays the response
+            threading.Thread(target=self.save_to_json, args=(message, response_content)).start()
+        elif not stateless:
+            # Nothing is persisted; drop the conversation in memory instead of rewriting files
+            self.context = []
 
         self.print_response(response_content)
         return response_content
 
-    def clear_json_files(self, json_files):
-        for json_file in json_files:
-            with open(json_file, 'w') as file:
-                json.dump({}, file)
-            print(f"The contents of {json_file} have been cleared.")
-
-    def save_to_json(self, input_text, output_text, save):
-        if save:
-            try:
-                with open(self.json_file, 'r') as file:
-                    data = json.load(file)
-            except FileNotFoundError:
-                data = {}
-            data[input_text] = output_text
-            with open(self.json_file, 'w') as file:
-                json.dump(data, file, indent=4)
-            print(f"Data successfully saved to {self.json_file}.")
-        else:
-            print("Save flag is False. No data was saved.")
+    def save_to_json(self, input_text, output_text):
+        # Append one JSON line per exchange instead of rewriting the whole history;
+        # the lock keeps overlapping background saves from interleaving lines
+        with self._save_lock:
+            with open(self.json_file, 'ab') as file:
+                file.write(orjson.dumps({input_text: output_text}) + b"\n")
+        print(f"Data successfully saved to {self.json_file}.")
+
+    def load(self):
+        """
+        Read the saved exchanges back into a dict of {input: output}.
+        """
+        data = {}
+        try:
+            with open(self.json_file, 'rb') as file:
+                for line in file:
+                    if line.strip():
+                        data.update(orjson.loads(line))
+        except FileNotFoundError:
+            pass
+        return data
 
     def print_response(self, response_content):
         print(f'BOT: {response_content}')
@@ -283,7 +808,7 @@ gpt4o = GPT4o(client)
 def get_gpt4o_response(input_text):
     try:
         print("Sending to GPT-4o:", input_text)
-        response_content = gpt4o.chat(f"{input_text}")
+        response_content = gpt4o.chat(f"{input_text}", stop_at_code_block=True, stateless=True)
         if not response_content:
             print("GPT-4o returned an empty response.")
             return None
@@ -292,62 +817,28 @@ def get_gpt4o_response(input_text):
         print(f"Error during GPT-4o call: {e}")
         return None
 
+# Matches the first ```python fenced block in a GPT response
+_CODE_RE = re.compile(r"```python\s*(.*?)\s*```", re.DOTALL)
+# Matches Google Calendar event links printed by the generated code
+_EVENT_LINK_RE = re.compile(r"https://www\.google\.com/calendar/event\?eid=[^\s'\"<>]+")
+
 def extract_code(response_text):
     """
     Extract Python code from a GPT output formatted in a code block.
     """
-    code_match = re.search(r"```python\s*(.*?)\s*```", response_text, re.DOTALL)
-    if code_match:
-        return code_match.group(1).strip()
-    return ""
+    code_match = _CODE_RE.search(response_text)
+    return code_match.group(1).strip() if code_match else ""
+
 
 # ------------------------------
-# Flask Routes
+# Code Generation Prompt
 # ------------------------------
-@app.route("/", methods=["GET"])
-def index():
-    return render_template("index.html")
-
-@app.route("/process", methods=["POST"])
-def process():
-    # Get the single consolidated input
-    user_input = request.form.get("text_input", "")
-    ocr_text = ""
-    selected_pages = []
-    selected_pages_str = request.form.get("selected_pages", "")
-    if selected_pages_str:
-        try:
-            selected_pages = [int(num.strip()) for num in selected_pages_str.split(",") if num.strip().isdigit()]
-            if len(selected_pages) > 2:
-                flash("Please select a maximum of 2 pages.")
-                return redirect(url_for('index'))
-        except ValueError:
-            flash("Invalid page numbers entered.")
-            return redirect(url_for('index'))
-
-    file = request.files.get("file_upload")
-    if file and file.filename != "":
-        if not allowed_file(file.filename):
-            flash("File type not allowed! Please upload an image, PDF, or DOCX file.")
-            return redirect(url_for('index'))
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-
-        ext = filename.rsplit('.', 1)[1].lower()
-        if ext in ['pdf', 'docx']:
-            ocr_text = ocr_image(file_path, selected_pages=selected_pages)
-        else:
-            with open(file_path, "rb") as f:
-                ocr_text = ocr_image(f)
-        os.remove(file_path)
-
-    combined_input = combine_inputs(user_input, ocr_text)
-    print("Combined Input:", combined_input)
-
-    prompt = f"""
-Generate a Python script to add all the calendar event(s) (that you identify in this user input text)
-to Google Calendar: {combined_input}.
+# Built once at import. The per-request input is appended after it rather than embedded,
+# so every request shares the same ~2.5K-token prefix and hits OpenAI's prompt cache
+# (cached input tokens are billed at half price and skip most prefill latency).
+_PROMPT_PREFIX = """
+Generate a Python script to add all the calendar event(s) (that you identify in the USER INPUT text
+at the end of this prompt) to Google Calendar.
 Carefully meet all the criteria and follow all the directions below:
 All API setup has been completed and authentication is managed via OAuth2 using the "installed" client credentials defined in credentials.json.
 Ensure that the script utilizes InstalledAppFlow (from google_auth_oauthlib.flow) for user authentication and stores tokens in token.json.
@@ -367,7 +858,7 @@ and convert to local time.
 Ensure that event titles are human yet professional--short, concise, and descriptive.
 Unless otherwise specified, include reminders at 10 minutes, 1 hour, and 1 day before as notifications.
 If a Google Meet link is explicitly required and certain, include conferenceData with a createRequest (using a unique requestId and conferenceSolutionKey set as 'hangoutsMeet'), and when calling events.insert or events.update include conferenceDataVersion=1.
-After event creation, use Python's webbrowser module to open the event link in the default browser.
+After event creation, print each event's link (htmlLink) so the web page can open it. Do not use the webbrowser module; the script runs on a server.
 At the end, include a summary of how many events were created along with additional details.
 
 IMPORTANT: Only use the following external dependencies when generating the code. Do not include any libraries or modules outside this list (e.g. dateutil) (aside from Python's standard library):
@@ -411,8 +902,8 @@ Also, here is how I have already authenticated earlier in my code (so credential
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 def create_credentials_file():
-    credentials_data = {{
-        "installed": {{
+    credentials_data = {
+        "installed": {
                 "client_id": google_client_id,
                 "project_id": google_project_id,
                 "auth_uri": "https://accounts.google.com/o/oauth2/v2/auth",
@@ -423,8 +914,8 @@ def create_credentials_file():
                     "urn:ietf:wg:oauth:2.0:oob",
                     "http://localhost"
                 ]
-            }}
-    }}
+            }
+    }
 def authenticate():
     creds = None
     if os.path.exists('token.json'):
@@ -441,6 +932,18 @@ def authenticate():
         print("token.json created successfully!")
     return creds
 
+A shared Google Calendar API client is also already defined. Call get_calendar_service() to get it instead of calling build() yourself (if you ever must call build(), pass static_discovery=True so no discovery document is fetched):
+
+def get_calendar_service():
+    creds = authenticate()
+    return build('calendar', 'v3', credentials=creds, static_discovery=True)
+
+To insert events, build all of the event bodies first and pass them as a list to the already-defined create_calendar_events(events), which sends every insert in a single batched HTTP request (with conferenceDataVersion=1) and returns the created events in order. Do not call events().insert() once per event:
+
+def create_calendar_events(events, calendar_id='primary'):
+    # Inserts every event body in batched HTTP requests (50 per batch) and returns the created events
+    ...
+
 For example, if the user input is:
 "team meeting next Friday at 2PM with a google meet conference call link"
 Then generate Python code similar to the example below:
@@ -448,7 +951,6 @@ Then generate Python code similar to the example below:
 ```python
 import os
 import uuid
-import webbrowser
 from datetime import datetime, timedelta, timezone
 
 import tzlocal
@@ -458,11 +960,11 @@ from googleapiclient.discovery import build
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
 # Assume that all these functions are defined earlier in the code you are adding to.
-# They create the credentials file and perform authentication.
+# They create the credentials file, perform authentication, and return the shared Calendar client.
 #
 # def create_credentials_file():
-#     credentials_data = {{
-#         "installed": {{
+#     credentials_data = {
+#         "installed": {
                 "client_id": google_client_id,
                 "project_id": google_project_id,
                 "auth_uri": "https://accounts.google.com/o/oauth2/v2/auth",
@@ -473,8 +975,8 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
                     "urn:ietf:wg:oauth:2.0:oob",
                     "http://localhost"
                 ]
-            }}
-#     }}
+            }
+#     }
 #
 # def authenticate():
 #     creds = None
@@ -491,62 +993,56 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
 #             token_file.write(creds.to_json())
 #         print("token.json created successfully!")
 #     return creds
+#
+# def get_calendar_service():
+#     creds = authenticate()
+#     return build('calendar', 'v3', credentials=creds, static_discovery=True)
+#
+# def create_calendar_events(events, calendar_id='primary'):
+#     # Inserts every event body in batched HTTP requests (50 per batch) and returns the created events
+#     ...
 
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
-def create_calendar_event(creds, event_title, start_dt, end_dt, with_meet=False):
-    '''Creates a Google Calendar event with an optional Google Meet link.'''
-    service = build('calendar', 'v3', credentials=creds)
+def build_event(event_title, start_dt, end_dt, with_meet=False):
+    '''Builds a Google Calendar event body with an optional Google Meet link.'''
     local_tz = tzlocal.get_localzone()
     start_local = start_dt.astimezone(local_tz)
     end_local = end_dt.astimezone(local_tz)
     
-    event = {{
+    event = {
         'summary': event_title,
         'description': 'Automatically created event via Calendar API.',
-        'start': {{
+        'start': {
             'dateTime': start_local.isoformat(),
             'timeZone': str(local_tz)
-        }},
-        'end': {{
+        },
+        'end': {
             'dateTime': end_local.isoformat(),
             'timeZone': str(local_tz)
-        }},
-        'reminders': {{
+        },
+        'reminders': {
             'useDefault': False,
             'overrides': [
-                {{'method': 'popup', 'minutes': 10}},
-                {{'method': 'popup', 'minutes': 60}},
-                {{'method': 'popup', 'minutes': 1440}}
+                {'method': 'popup', 'minutes': 10},
+                {'method': 'popup', 'minutes': 60},
+                {'method': 'popup', 'minutes': 1440}
             ]
-        }}
-    }}
+        }
+    }
     
     if with_meet:
-        event['conferenceData'] = {{
-            'createRequest': {{
+        event['conferenceData'] = {
+            'createRequest': {
                 'requestId': str(uuid.uuid4()),
-                'conferenceSolutionKey': {{'type': 'hangoutsMeet'}}
-            }}
-        }}
-    
-    created_event = service.events().insert(
-        calendarId='primary',
-        body=event,
-        conferenceDataVersion=1
-    ).execute()
-    
-    print("Event created successfully!")
-    print("Event link:", created_event.get('htmlLink'))
-    webbrowser.open(created_event.get('htmlLink'))
+                'conferenceSolutionKey': {'type': 'hangoutsMeet'}
+            }
+        }
     
-    return created_event
+    return event
 
 def main():
-    # Reuse your existing authentication function
-    creds = authenticate()
-    
     # Get current UTC time
     now = datetime.now(timezone.utc)
     
@@ -554,9 +1050,16 @@ def main():
     start_time = now + timedelta(days=2, hours=14)
     end_time = start_time + timedelta(hours=1)
     
-    event_title = "Team Meeting"
-    created_event = create_calendar_event(creds, event_title, start_time, end_time, with_meet=True)
-    print("Summary: 1 event created with title:", created_event.get('summary'))
+    # Build every event body first (one per identified event), then insert them all in one batched request
+    events = [build_event("Team Meeting", start_time, end_time, with_meet=True)]
+    created_events = create_calendar_events(events)
+    
+    for created_event in created_events:
+        print("Event created successfully!")
+        print("Event link:", created_event.get('htmlLink'))
+    
+    print(f"Summary: {len(created_events)} event(s) created with title(s):",
+          ", ".join(created_event.get('summary') for created_event in created_events))
 
 if __name__ == "__main__":
     main()
@@ -564,28 +1067,272 @@ if __name__ == "__main__":
 Return only the Python code in a code block.
     """
 
-    # Clear context files if they exist
-    for file_name in ['gpt4oContext1.json', 'gpt4oMiniContext1.json']:
-        if os.path.exists(file_name):
-            with open(file_name, 'w') as f:
-                json.dump({}, f)
 
-    response_text = get_gpt4o_response(prompt)
-    generated_code = extract_code(response_text)
+# ------------------------------
+# Generated Code Cache and Execution
+# ------------------------------
+# Generated code is cached by normalized input so repeat requests skip the GPT-4o round-trip.
+# Entries expire so relative dates ("next Friday") are regenerated regularly.
+CODE_CACHE_DIR = 'codecache'
+CODE_CACHE_TTL = 24 * 60 * 60
+_CODE_CACHE = Cache(CODE_CACHE_DIR)
+
+# Generated code runs in a forked child so requests don't serialize on this process.
+# Where fork is unavailable (Windows) or unsafe (macOS) it runs in a fresh interpreter
+# instead, which expects the helpers defined in this module (authenticate, SCOPES, ...).
+GENERATED_CODE_TIMEOUT = 300
+_CAN_FORK = 'fork' in multiprocessing.get_all_start_methods() and sys.platform != 'darwin'
+_GENERATED_CODE_PREAMBLE = "from app import *\n"
+
+# The prompt is hashed into every key so code generated under an older prompt
+# is not replayed after the prompt changes
+_PROMPT_SHA1 = hashlib.sha1(_PROMPT_PREFIX.encode())
+
+def code_cache_key(combined_input):
+    """
+    Hash the prompt and the combined input with whitespace and case normalized.
+    """
+    normalized_input = " ".join(combined_input.lower().split())
+    digest = _PROMPT_SHA1.copy()
+    digest.update(normalized_input.encode())
+    return digest.hexdigest()
+
+
+def _run_generated(generated_code, output_queue):
+    """
+    Child-process entry point: exec the generated code against this module's globals
+    (authenticate, get_calendar_service, ...) and send back its captured output.
+    """
+    buffer = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(buffer):
+            exec(generated_code, dict(globals(), __name__="__main__"))
+    except SystemExit:
+        pass
+    except Exception as e:
+        buffer.write(f"Execution Error: {e}")
+    output_queue.put(buffer.getvalue())
+
+
+def _run_generated_subprocess(generated_code):
+    """
+    Execute generated code in a fresh interpreter and return its captured output.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [APP_DIR, env.get("PYTHONPATH")]))
+    try:
+        result = subprocess.run([sys.executable, "-c", _GENERATED_CODE_PREAMBLE + generated_code],
+                                capture_output=True, text=True, env=env,
+                                timeout=GENERATED_CODE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return f"Execution Error: timed out after {GENERATED_CODE_TIMEOUT} seconds"
+    execution_output = result.stdout
+    if result.returncode != 0:
+        error_lines = result.stderr.strip().splitlines()
+        execution_output += f"Execution Error: {error_lines[-1] if error_lines else result.returncode}"
+    return execution_output
+
+
+def run_generated_code(generated_code):
+    """
+    Execute generated code in a forked child process and return its captured output.
+    Forking inherits the already-imported modules and warm caches, so the code starts
+    immediately instead of re-importing everything in a fresh interpreter.
+    """
+    if not _CAN_FORK:
+        return _run_generated_subprocess(generated_code)
+    context = multiprocessing.get_context("fork")
+    output_queue = context.Queue()
+    process = context.Process(target=_run_generated, args=(generated_code, output_queue))
+    process.start()
+    deadline = time.monotonic() + GENERATED_CODE_TIMEOUT
+    try:
+        # Read before joining so a large output can't block the child on a full pipe
+        while True:
+            try:
+                return output_queue.get(timeout=1)
+            except queue.Empty:
+                if not process.is_alive():
+                    try:
+                        return output_queue.get(timeout=1)
+                    except queue.Empty:
+                        return f"Execution Error: process exited with code {process.exitcode}"
+                if time.monotonic() > deadline:
+                    return f"Execution Error: timed out after {GENERATED_CODE_TIMEOUT} seconds"
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def _prewarm_calendar_service():
+    """
+    Load credentials and build the Calendar client ahead of running generated code.
+    """
+    try:
+        get_calendar_service()
+    except Exception as e:
+        print(f"Error preparing the Google Calendar client: {e}")
+
+
+def generate_and_run(combined_input):
+    """
+    Generate calendar code for the combined input (reusing cached code when possible)
+    and run it. Returns (generated_code, execution_output).
+    Runs in a background worker process.
+    """
+    # Warm the credentials and Calendar client while GPT-4o writes the code; the forked
+    # child that runs the code inherits them instead of loading them itself
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(_prewarm_calendar_service)
+
+        cache_key = code_cache_key(combined_input)
+        generated_code = _CODE_CACHE.get(cache_key)
+        from_cache = generated_code is not None
+        if from_cache:
+            print("Using cached generated code.")
+        else:
+            prompt = _PROMPT_PREFIX + f"\n\nUSER INPUT:\n{combined_input}"
+            response_text = get_gpt4o_response(prompt)
+            generated_code = extract_code(response_text or "")
+
+    # Leaving the executor waits for the prewarm, so nothing is mid-flight when we fork
     execution_output = ""
     if generated_code:
-        try:
-            f = io.StringIO()
-            with contextlib.redirect_stdout(f):
-                exec(generated_code, globals())
-            execution_output = f.getvalue()
-        except Exception as e:
-            execution_output = f"Execution Error: {e}"
+        execution_output = run_generated_code(generated_code)
+        # Only code that ran cleanly is cached, so a retry after a failure regenerates it
+        if "Execution Error" in execution_output:
+            _CODE_CACHE.delete(cache_key)
+        elif not from_cache:
+            _CODE_CACHE.set(cache_key, generated_code, expire=CODE_CACHE_TTL)
+    return generated_code, execution_output
 
-    return render_template("result.html",
-                           combined_input=combined_input,
-                           generated_code=generated_code,
-                           execution_output=execution_output)
+
+# ------------------------------
+# Background Jobs
+# ------------------------------
+# GPT-4o calls and generated code run in worker processes so the HTTP worker is freed
+# immediately. Jobs live in this process's memory, so run a single (threaded) web worker.
+EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count())
+_EXECUTOR_LOCK = threading.Lock()
+JOBS = {}
+JOB_TTL = timedelta(hours=1)
+
+def submit_job(fn, *args):
+    """
+    Submit a job to EXECUTOR, replacing the pool if it was broken by a worker dying
+    (OOM kill, crash in a C extension); a broken pool otherwise rejects every job.
+    """
+    global EXECUTOR
+    executor = EXECUTOR
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        with _EXECUTOR_LOCK:
+            # Another request may have already replaced it
+            if EXECUTOR is executor:
+                print("Background job pool is broken; starting a new one.")
+                executor.shutdown(wait=False)
+                EXECUTOR = ProcessPoolExecutor(max_workers=os.cpu_count())
+            executor = EXECUTOR
+        return executor.submit(fn, *args)
+
+def prune_finished_jobs():
+    """
+    Forget finished jobs older than JOB_TTL.
+    """
+    cutoff = datetime.now(timezone.utc) - JOB_TTL
+    for job_id, job in list(JOBS.items()):
+        if job["future"].done() and job["created"] < cutoff:
+            JOBS.pop(job_id, None)
+
+
+# ------------------------------
+# Flask Routes
+# ------------------------------
+# Page numbers in the "selected pages" field, e.g. "1, 3"
+_PAGES_RE = re.compile(r'\d+')
+# Anything besides digits, commas and whitespace (ranges like "1-3", words, ...) is rejected
+_INVALID_PAGES_RE = re.compile(r'[^\d,\s]')
+MAX_SELECTED_PAGES = 2
+
+@app.route("/", methods=["GET"])
+def index():
+    return render_template("index.html")
+
+@app.route("/process", methods=["POST"])
+def process():
+    # Get the single consolidated input
+    user_input = request.form.get("text_input", "")
+    ocr_text = ""
+    selected_pages_str = request.form.get("selected_pages", "")
+    if _INVALID_PAGES_RE.search(selected_pages_str):
+        flash("Invalid page numbers entered.")
+        return redirect(url_for('index'))
+    page_numbers = _PAGES_RE.findall(selected_pages_str)
+    if len(page_numbers) > MAX_SELECTED_PAGES:
+        flash(f"Please select a maximum of {MAX_SELECTED_PAGES} pages.")
+        return redirect(url_for('index'))
+    selected_pages = list(map(int, page_numbers))
+
+    file = request.files.get("file_upload")
+    if file and file.filename != "":
+        if not allowed_file(file.filename):
+            flash("File type not allowed! Please upload an image, PDF, or DOCX file.")
+            return redirect(url_for('index'))
+        if isinstance(file.stream, io.BytesIO):
+            # Images were kept in memory by UploadRequest; OCR them without a disk round-trip
+            ocr_text = cached_ocr(file.stream.getvalue())
+        else:
+            # The upload was already streamed to a uniquely named file by UploadRequest;
+            # PDFs and DOCX are OCR'd there since poppler and docx2pdf both need a real file.
+            # remove_unused_uploads deletes it once the request is done.
+            file.stream.close()
+            ocr_text = cached_ocr(file.stream.name, selected_pages=selected_pages)
+
+    combined_input = combine_inputs(user_input, ocr_text)
+    print("Combined Input:", combined_input)
+
+    # Code generation and execution run in the background; the client polls for the result
+    prune_finished_jobs()
+    job_id = str(uuid.uuid4())
+    JOBS[job_id] = {"future": submit_job(generate_and_run, combined_input),
+                    "combined_input": combined_input,
+                    "created": datetime.now(timezone.utc)}
+    return redirect(url_for('result', job_id=job_id))
+
+@app.route("/result/<job_id>", methods=["GET"])
+def result(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        flash("That request has expired or does not exist.")
+        return redirect(url_for('index'))
+    if not job["future"].done():
+        return render_template("processing.html"), 202
+
+    try:
+        generated_code, execution_output = job["future"].result()
+    except Exception as e:
+        generated_code, execution_output = "", f"Execution Error: {e}"
+    # The browser opens the created events itself; the server never launches one.
+    # Only the first render auto-opens them, so reloads and back-navigation just list them.
+    event_links = list(dict.fromkeys(_EVENT_LINK_RE.findall(execution_output)))
+    auto_open = not job.get("links_opened")
+    job["links_opened"] = True
+    response = make_response(render_template("result.html",
+                                             combined_input=job["combined_input"],
+                                             generated_code=generated_code,
+                                             execution_output=execution_output,
+                                             event_links=event_links,
+                                             auto_open=auto_open))
+    # Keep the browser from replaying the auto-opening page from its cache
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+# Compile templates at import so gunicorn --preload workers fork with them already loaded
+if __name__ != "__main__":
+    for template_name in ("index.html", "processing.html", "result.html"):
+        app.jinja_env.get_template(template_name)
 
 # ------------------------------
 # Run the Flask App
@@ -1 +1,7 @@
-console.log("Script loaded.");
\ No newline at end of file
+// Open links marked data-auto-open (e.g. newly created calendar events) in new tabs.
+// Popup blockers may stop this; the links stay on the page to click instead.
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("a[data-auto-open]").forEach(function (link) {
+    window.open(link.href, "_blank", "noopener");
+  });
+});